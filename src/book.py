@@ -1,10 +1,11 @@
 """
 This module contains the implementation of a book class that manages an order book for a stock.
 """
-import copy
-import heapq
+import bisect
+from collections import deque
+from operator import attrgetter
 from order import Order
-from typing import List, Tuple
+from typing import Deque, Dict, List, Tuple, Union
 
 
 class Book:
@@ -13,22 +14,66 @@ class Book:
 
     Attributes:
         stock: The stock being traded.
-        sell_queue: The queue of sell orders, that is implemented as a min heap.
-        buy_queue: The queue of buy orders, that is implemented as a max heap.
+        bids: A dictionary mapping each buy price to the FIFO queue of orders at that price level.
+        asks: A dictionary mapping each sell price to the FIFO queue of orders at that price level.
+        bid_keys: The sorted list of sort keys of the buy price levels. The best bid is the last.
+        ask_keys: The sorted list of sort keys of the sell price levels. The best ask is the last.
+        _best_bid: Cached best buy price, or -inf if there are no buy orders.
+        _best_ask: Cached best sell price, or inf if there are no sell orders.
+        _best_bid_level: Cached price level of the best buy price, empty if there is none.
+        _best_ask_level: Cached price level of the best sell price, empty if there is none.
 
     Notes:
         The book is the main logic component of the Order Matching System. It is the actual
         responsible for matching the orders.
+
+        Prices are integer ticks (see Order.TICKS_PER_UNIT) and are only converted to units
+        when the book is printed.
+
+        Orders are kept in price levels: each price maps to a deque of orders in arrival order,
+        so priority inside a level is given by position and matching consumes orders with
+        popleft(). The sorted key lists are only touched when a price level is created or
+        emptied, which is much less frequent than fills in a book with many orders per level.
+
+        The sort key of a level is computed once, when the level is created: a buy level is keyed
+        by its price and a sell level by its negated price. Both lists are then plain ascending
+        lists of numbers with the best level last, so keeping them sorted never calls back into
+        Python code and removing the best level is a pop() from the end.
+
+        Nearly every match touches the top of the book, so the best price and its level are
+        cached on each side. The cache is only refreshed when a better level is created or the
+        best level is emptied; every fill in between reuses the cached deque and compares
+        against the cached price.
+
+        An empty side is represented by a sentinel: an infinite best price (inf for the sell
+        side, -inf for the buy side) with an empty level. No finite limit price crosses the
+        sentinel, so the matching loops end without checking whether the opposite side has any
+        orders, and creating the first level of a side is just a better price. Because of this,
+        limit prices must be finite.
+
+        The attributes are declared in __slots__, so they are read through slot descriptors
+        instead of an instance __dict__ on every access in the matching loops.
     """
+    __slots__ = (
+        "stock", "bids", "asks", "bid_keys", "ask_keys",
+        "_best_bid", "_best_ask", "_best_bid_level", "_best_ask_level",
+    )
+
     def __init__(self, stock: str):
         self.stock = stock
-        self.sell_queue = []  # min heap
-        self.buy_queue = []  # max heap
+        self.bids: Dict[int, Deque[Order]] = {}
+        self.asks: Dict[int, Deque[Order]] = {}
+        self.bid_keys: List[int] = []  # prices, best bid last
+        self.ask_keys: List[int] = []  # negated prices, best ask last
+        self._best_bid: Union[int, float] = float("-inf")  # float only for the sentinel
+        self._best_ask: Union[int, float] = float("inf")  # float only for the sentinel
+        self._best_bid_level: Deque[Order] = deque()
+        self._best_ask_level: Deque[Order] = deque()
 
     def add_order(
             self, order_id: int, order_type: Order.Type, order_side: Order.Side,
-            quantity: int, price: float = float("inf"), stock: str = "STOCK"
-    ) -> Tuple[Order, List[Tuple[int, int]]]:
+            quantity: int, price: Union[int, float] = float("inf"), stock_id: int = 0
+    ) -> Tuple[Order, List[int]]:
         """
         Creates and adds an order to the book and execute it as a limit order or a market order.
 
@@ -37,179 +82,326 @@ class Book:
             order_type: The type of the order (Order.Type.LIMIT | Order.Type.MARKET).
             order_side: The side of the order (Order.Type.BUY | Order.Type.SELL).
             quantity: The number of shares of the order.
-            price: The price per share.
-            stock: The stock being traded. Defaults to "STOCK".
+            price: The price per share, in ticks. Market orders have no price and default to
+                float("inf"), which is the only reason a float is accepted here.
+            stock_id: The id of the stock being traded. Defaults to 0, the id of "STOCK".
 
         Returns:
-            A tuple containing the Order object and a list of executed trades as tuples with
-            quantity and price.
+            A tuple containing the Order object and the executed trades, as a flat list of
+            alternating quantities and prices.
         """
-        order = Order(order_id, order_type, order_side, quantity, price, stock)
-        if order.order_type == Order.Type.LIMIT:
+        order = Order(order_id, order_type, order_side, quantity, price, stock_id)
+        if order.order_type is Order.Type.LIMIT:
             return order, self.add_limit_order(order)
-        else:  # order.order_side == Order.Type.MARKET
+        else:  # order.order_type is Order.Type.MARKET
             return order, self.add_market_order(order)
 
-    def add_limit_order(self, order: Order) -> List[Tuple[int, int]]:
+    def add_limit_order(self, order: Order) -> List[int]:
         """
         Adds a limit order to the book and matches it against the best available existing orders,
         until the order is fulfilled (quantity = 0) or there are no more favorable orders available.
 
         Favorable orders have either equal price of the order or better (e.g. for a sell
         order, this means a buy order that offers equal or higher price). An order with the
-        remaining quantity is placed if the quantity is not fulfilled. Has linearithmic
-        worst-case time complexity, although this may not happen frequently.
+        remaining quantity is placed if the quantity is not fulfilled. Each fill costs constant
+        time, including emptying the best price level, whose key is last in its key list.
+        Creating a price level inserts its key into the sorted key list, which is linear in the
+        number of price levels.
 
         Args:
             order : The limit order to be added to the order book.
 
         Returns:
-            A list of tuples representing any trades that were executed as a result of adding the
-            new order. Each tuple contains two integers: the quantity and price of the executed
-            trade.
+            A flat list of the trades that were executed as a result of adding the new order. Each
+            trade takes two consecutive integers: the quantity and price of the executed trade.
 
         Notes:
-            This function adds a limit order to the appropriate queue only after it matches it
-            against any favorable orders in the opposite queue. Hence, the new order is added
-            only if not completely executed. The compare() function is responsible for finding
-            out if there are still favorable orders.
+            This function adds a limit order to the appropriate price level only after it matches
+            it against any favorable orders in the opposite side. Hence, the new order is added
+            only if not completely executed. The matching itself is done by _match_limit_buy()
+            or _match_limit_sell(), which are chosen once per order, so the price comparison in
+            the matching loop is written inline instead of going through a function call.
         """
-        if order.order_side == Order.Side.BUY:
-            queue = self.sell_queue
-            order_queue = self.buy_queue
-            def compare(x, y): return x >= y
-        else:  # order_side == Order.Side.SELL
-            queue = self.buy_queue
-            order_queue = self.sell_queue
-            def compare(x, y): return x <= y
+        if order.order_side is Order.Side.BUY:
+            trades = self._match_limit_buy(order)
+            order_levels, add_level = self.bids, self._add_bid_level
+        else:  # order.order_side is Order.Side.SELL
+            trades = self._match_limit_sell(order)
+            order_levels, add_level = self.asks, self._add_ask_level
+
+        # Place order in its price level if did not execute the whole quantity.
+        if order.quantity > 0:
+            level = order_levels.get(order.price)
+            if level is None:
+                level = add_level(order.price)
+            if not level or level[-1].order_id < order.order_id:
+                level.append(order)
+            else:  # modified orders keep the time priority of their id
+                bisect.insort(level, order, key=attrgetter("order_id"))
+
+        return trades
+
+    def _match_limit_buy(self, order: Order) -> List[int]:
+        """
+        Matches a buy limit order against the sell orders with equal or lower price.
+
+        Args:
+            order: The buy limit order being added to the book.
+
+        Returns:
+            A flat list of alternating quantities and prices of the executed trades.
+
+        Notes:
+            The remaining quantity and the order price are kept in local variables during the
+            matching, which avoids an attribute read and write on the order at every fill. The
+            remaining quantity is written back to the order once the matching ends.
+
+            Every fill follows the same path: the executed quantity is the smaller of the two
+            quantities, it is subtracted from both orders, and the top order is popped only if
+            it was fulfilled. There are no separate paths for fulfilling either order.
 
+            Trades are written as two plain ints into one flat list instead of as a (quantity,
+            price) tuple each, so a fill allocates nothing. Pairs are only built by the callers
+            that need them, such as the engine when it formats trade messages.
+        """
+        price, level = self._best_ask, self._best_ask_level
         trades = []
+        quantity, order_price = order.quantity, order.price
+
+        # Try to match sell orders level by level while it can.
+        while quantity > 0 and order_price >= price:
+            while level and quantity > 0:
+                top_order = level[0]
+                executed = top_order.quantity
+                if quantity < executed:
+                    executed = quantity
+                trades.append(executed)
+                trades.append(price)
+                quantity -= executed
+                top_order.quantity -= executed
+                if top_order.quantity == 0:
+                    level.popleft()
+            if not level:
+                price, level = self._pop_best_ask_level()
+        order.quantity = quantity
+        return trades
 
-        # Try to match opposite orders while it can.
-        if queue:
-            top_order = queue[0]
-            while queue and order.quantity > 0 and compare(order.price, top_order.price):
-                if order.quantity >= top_order.quantity:
-                    # Ignore deleted orders.
-                    if top_order.quantity > 0:
-                        trades.append((top_order.quantity, top_order.price))
-                        order.quantity -= top_order.quantity
-                        top_order.quantity = 0
-                    heapq.heappop(queue)
-                    if queue:
-                        top_order = queue[0]
-                else:
-                    top_order.quantity -= order.quantity
-                    trades.append((order.quantity, top_order.price))
-                    order.quantity = 0
+    def _match_limit_sell(self, order: Order) -> List[int]:
+        """
+        Matches a sell limit order against the buy orders with equal or higher price. Mirrors
+        _match_limit_buy().
 
-        # Place order in queue if did not execute the whole quantity.
-        if order.quantity > 0:
-            heapq.heappush(order_queue, order)
+        Args:
+            order: The sell limit order being added to the book.
 
+        Returns:
+            A flat list of alternating quantities and prices of the executed trades.
+        """
+        price, level = self._best_bid, self._best_bid_level
+        trades = []
+        quantity, order_price = order.quantity, order.price
+
+        # Try to match buy orders level by level while it can.
+        while quantity > 0 and order_price <= price:
+            while level and quantity > 0:
+                top_order = level[0]
+                executed = top_order.quantity
+                if quantity < executed:
+                    executed = quantity
+                trades.append(executed)
+                trades.append(price)
+                quantity -= executed
+                top_order.quantity -= executed
+                if top_order.quantity == 0:
+                    level.popleft()
+            if not level:
+                price, level = self._pop_best_bid_level()
+        order.quantity = quantity
         return trades
 
-    def add_market_order(self, order: Order) -> List[Tuple[int, int]]:
+    def add_market_order(self, order: Order) -> List[int]:
         """
         Adds a market order to the book and matches it against the best available existing orders,
-        until the order is fulfilled (quantity = 0) or there are no more orders available. Has
-        linearithmic worst-case time complexity, although this may not happen frequently.
+        until the order is fulfilled (quantity = 0) or there are no more orders available. Each
+        fill costs constant time. Any quantity left unfilled is discarded, since market orders are
+        never placed in the book.
 
         Args:
             order : The limit order to be added to the order book.
 
         Returns:
-            A list of tuples representing any trades that were executed as a result of adding the
-            new order. Each tuple contains two integers: the quantity and price of the executed
-            trade.
+            A flat list of the trades that were executed as a result of adding the new order. Each
+            trade takes two consecutive integers: the quantity and price of the executed trade.
         """
-        if order.order_side == Order.Side.BUY:
-            queue = self.sell_queue
-        else:  # order.order_side == Order.Type.SELL
-            queue = self.buy_queue
+        if order.order_side is Order.Side.BUY:
+            price, level = self._best_ask, self._best_ask_level
+            pop_best_level = self._pop_best_ask_level
+        else:  # order.order_side is Order.Side.SELL
+            price, level = self._best_bid, self._best_bid_level
+            pop_best_level = self._pop_best_bid_level
 
         trades = []
-
-        # Try to match opposite orders while it can.
-        if queue:
-            top_order = queue[0]
-            while queue and order.quantity > 0:
-                if order.quantity >= top_order.quantity:
-                    # Ignore deleted orders.
-                    if top_order.quantity > 0:
-                        trades.append((top_order.quantity, top_order.price))
-                        order.quantity -= top_order.quantity
-                        top_order.quantity = 0
-                    heapq.heappop(queue)
-                    if queue:
-                        top_order = queue[0]
-                else:
-                    top_order.quantity -= order.quantity
-                    trades.append((order.quantity, top_order.price))
-                    order.quantity = 0
+        quantity = order.quantity
+
+        # Try to match opposite orders level by level while it can.
+        while quantity > 0 and level:
+            while level and quantity > 0:
+                top_order = level[0]
+                executed = top_order.quantity
+                if quantity < executed:
+                    executed = quantity
+                trades.append(executed)
+                trades.append(price)
+                quantity -= executed
+                top_order.quantity -= executed
+                if top_order.quantity == 0:
+                    level.popleft()
+            if not level:
+                price, level = pop_best_level()
+
+        # A market order has no reason to exist after executed.
+        order.quantity = 0
         return trades
 
-    # noinspection PyMethodMayBeStatic
+    def _add_bid_level(self, price: int) -> Deque[Order]:
+        """
+        Creates an empty buy price level and updates the best bid cache if the price improves it.
+
+        Args:
+            price: The price of the new level.
+
+        Returns:
+            The new price level.
+        """
+        level = self.bids[price] = deque()
+        bisect.insort(self.bid_keys, price)
+        if price > self._best_bid:
+            self._best_bid, self._best_bid_level = price, level
+        return level
+
+    def _add_ask_level(self, price: int) -> Deque[Order]:
+        """
+        Creates an empty sell price level and updates the best ask cache if the price improves it.
+
+        Args:
+            price: The price of the new level.
+
+        Returns:
+            The new price level.
+        """
+        level = self.asks[price] = deque()
+        bisect.insort(self.ask_keys, -price)
+        if price < self._best_ask:
+            self._best_ask, self._best_ask_level = price, level
+        return level
+
+    def _pop_best_bid_level(self) -> Tuple[Union[int, float], Deque[Order]]:
+        """
+        Removes the emptied best buy price level and refills the best bid cache.
+
+        Returns:
+            The new best bid price, in ticks, and its level, or the sentinel if there are no buy
+            orders. The price is only a float for the -inf sentinel.
+        """
+        del self.bids[self.bid_keys.pop()]
+        if self.bid_keys:
+            self._best_bid = self.bid_keys[-1]
+            self._best_bid_level = self.bids[self._best_bid]
+        else:
+            self._best_bid, self._best_bid_level = float("-inf"), deque()
+        return self._best_bid, self._best_bid_level
+
+    def _pop_best_ask_level(self) -> Tuple[Union[int, float], Deque[Order]]:
+        """
+        Removes the emptied best sell price level and refills the best ask cache.
+
+        Returns:
+            The new best ask price, in ticks, and its level, or the sentinel if there are no sell
+            orders. The price is only a float for the inf sentinel.
+        """
+        del self.asks[-self.ask_keys.pop()]
+        if self.ask_keys:
+            self._best_ask = -self.ask_keys[-1]
+            self._best_ask_level = self.asks[self._best_ask]
+        else:
+            self._best_ask, self._best_ask_level = float("inf"), deque()
+        return self._best_ask, self._best_ask_level
+
     def delete_order(self, order: Order) -> None:
         """
-        Deletes an order from the book in constant time.
+        Deletes an active order from the book. Has linear time complexity in the number of orders
+        at the order's price level. If this empties the level, removing its key from the sorted
+        key list adds linear time complexity in the number of price levels.
 
         Args:
             order: the order to be deleted
 
         Notes:
-            Setting the order's quantity to 0 is the way of removing orders. Previous iterations
-            used heapq.heapify() and heapq.heappop() to achieve this, but it was unnecessary since
-            the Book class already handles orders with quantity = 0 in the add_{limit|market}_order
-            functions. It is important to note that the price of the order must be kept intact in
-            order to maintain the heap invariant.
+            The order is unlinked from its price level right away, instead of being left in the
+            book with quantity = 0 for the matching loop to skip. Cancelled orders would
+            otherwise accumulate in the levels under heavy cancel churn and be paid for at every
+            match. The order's price identifies its level, so no back-pointer is needed. The
+            removal scans only the orders of that level, in C. The order's quantity is still set
+            to 0 so that it reads as inactive.
         """
+        if order.order_side is Order.Side.BUY:
+            level = self.bids[order.price]
+            level.remove(order)
+            if not level:
+                if order.price == self._best_bid:
+                    self._pop_best_bid_level()
+                else:
+                    del self.bids[order.price]
+                    del self.bid_keys[bisect.bisect_left(self.bid_keys, order.price)]
+        else:  # order.order_side is Order.Side.SELL
+            level = self.asks[order.price]
+            level.remove(order)
+            if not level:
+                if order.price == self._best_ask:
+                    self._pop_best_ask_level()
+                else:
+                    del self.asks[order.price]
+                    del self.ask_keys[bisect.bisect_left(self.ask_keys, -order.price)]
         order.quantity = 0
 
     def modify_order(
-            self, order: Order, quantity: int, price: float
-    ) -> Tuple[Order, List[Tuple[int, int]]]:
+            self, order: Order, quantity: int, price: int
+    ) -> Tuple[Order, List[int]]:
         """
-        Modifies an existing order by updating its quantity and/or price. Has worst-case
-        logarithmic time complexity.
+        Modifies an existing order by updating its quantity and/or price. Costs a deletion
+        followed by an addition: linear in the number of orders of the old price level, plus
+        linear in the number of price levels if that level empties, and then the cost of adding
+        a limit order, plus linear in the number of orders of the new price level to keep the
+        order in id priority.
 
         Args:
             order: The order to be modified.
             quantity: The new quantity for the order.
-            price: The new price for the order.
+            price: The new price for the order, in ticks.
 
         Returns:
-            A list of tuples representing any trades that were executed as a result of modifying the
-            new order. Each tuple contains two integers: the quantity and price of the executed
-            trade.
+            The modified order and a flat list of the trades that were executed as a result of
+            modifying it. Each trade takes two consecutive integers: the quantity and price of the
+            executed trade.
 
         Notes:
-            To modify an order, the approach is to delete the existing order by setting its
-            quantity to 0 and then adding a new order with the desired changes. In previous
-            implementations, heapq.heapify() was used on the queue to adjust the order positions,
-            but this operation had linear time complexity. Furthermore, since it's not feasible to
-            consistently track the position of an order in the heap, using heapq._siftup() or
-            heapq._siftdown() to adjust the heap in logarithmic time and eliminate the need for
-            creating a new order isn't a viable option. Also, implementing a modified heap with
-            maintained indices would introduce additional complexity, which is deemed excessive
-            for the marginal benefits it would provide.
-        """
+            To modify an order, the approach is to unlink it from its price level, update its
+            price and quantity in place and add it again as a limit order, so that it is matched
+            against the opposite side before resting. No new order is created. The order keeps
+            its id, and therefore its time priority among the orders of its (possibly new) price
+            level. If that level already exists, no sorted key list is touched.
 
-        new_order_id, order.order_id = order.order_id, -1
+            Only active limit orders can be modified, since they are the only orders in the book.
+        """
         self.delete_order(order)
-        return self.add_order(
-            new_order_id,
-            order.order_type,
-            order.order_side,
-            quantity,
-            price,
-            order.stock,
-        )
+        order.price = price
+        order.quantity = quantity
+        return order, self.add_limit_order(order)
 
     def __repr__(self) -> str:
         """
-        Creates a table representation of the book, with buy and sell orders. Has best-case and
-        worst-case linearithmic time complexity.
+        Creates a table representation of the book, with buy and sell orders. Has linear time
+        complexity, since price levels are already kept sorted.
 
         Returns:
             Structured string representing a book, e.g.:
@@ -234,6 +426,10 @@ class Book:
 
             The same principles are valid for the sell orders column, except it does not have
             r_offset.
+
+            The orders are read in place from the price levels, which are already sorted, and the
+            table is joined once at the end. Since every row starts with the quantity, at_idx is
+            known from the length of the quantity without searching the row.
         """
         header = (
             "\n"
@@ -246,42 +442,34 @@ class Book:
         const_offset = 2
 
         # Build buy orders column.
-        buy_queue_copy = copy.deepcopy(self.buy_queue)
+        ticks_per_unit = Order.TICKS_PER_UNIT
+        fine_offset = 2
         buy_column = []
-        while buy_queue_copy:
-            el = heapq.heappop(buy_queue_copy)
-            row = f"{el.quantity} @ {el.price:.2f} ({el.order_id})"
-            if el.quantity <= 0:
-                continue
-            at_idx = row.find("@")
-            fine_offset = 2
-            l_offset = col_width//2 - at_idx + const_offset - fine_offset
-            r_offset = col_width//2 - (len(row) - at_idx - 1) + fine_offset
-            buy_column.append(" " * l_offset + row + " " * r_offset)
+        for key in reversed(self.bid_keys):
+            for el in self.bids[key]:
+                quantity = str(el.quantity)
+                row = f"{quantity} @ {el.price / ticks_per_unit:.2f} ({el.order_id})"
+                at_idx = len(quantity) + 1
+                l_offset = col_width//2 - at_idx + const_offset - fine_offset
+                r_offset = col_width//2 - (len(row) - at_idx - 1) + fine_offset
+                buy_column.append(" " * l_offset + row + " " * r_offset)
 
         # Build sell orders column.
-        sell_queue_copy = copy.deepcopy(self.sell_queue)
         sell_column = []
-        while sell_queue_copy:
-            el = heapq.heappop(sell_queue_copy)
-            if el.quantity <= 0:
-                continue
-            row = f"{el.quantity} @ {el.price:.2f} ({el.order_id})"
-            at_idx = row.index("@")
-            l_offset = col_width//2 - at_idx - const_offset
-            sell_column.append(" " * l_offset + row)
+        for key in reversed(self.ask_keys):
+            for el in self.asks[-key]:
+                quantity = str(el.quantity)
+                row = f"{quantity} @ {el.price / ticks_per_unit:.2f} ({el.order_id})"
+                at_idx = len(quantity) + 1
+                l_offset = col_width//2 - at_idx - const_offset
+                sell_column.append(" " * l_offset + row)
 
         # Add blank rows where needed.
-        while len(buy_column) > len(sell_column):
-            sell_column.append(" " * col_width)
-        while len(buy_column) < len(sell_column):
-            buy_column.append(" " * (col_width + const_offset))
+        n_rows = max(len(buy_column), len(sell_column))
+        buy_column += [" " * (col_width + const_offset)] * (n_rows - len(buy_column))
+        sell_column += [" " * col_width] * (n_rows - len(sell_column))
 
         # Build table.
-        body = ""
-        table_data = zip(buy_column, sell_column)
-        for row in table_data:
-            body += "\n"
-            body += "|".join(row)
+        body = "".join("\n" + "|".join(row) for row in zip(buy_column, sell_column))
         body += "\n"
         return header + body
@@ -2,9 +2,11 @@
 This module contains the implementation of a simple matching engine that allows users to place
 market and limit orders, as well as cancel and modify them.
 """
+import csv
+import math
 from order import Order
 from book import Book
-from typing import Dict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
 
 
 class MatchingEngine:
@@ -13,17 +15,28 @@ class MatchingEngine:
     for any number of stocks.
 
     Attributes:
-        uid: Variable that stores the last assigned id to an order. It is incremented everytime an
-            order is added.
-        stock_set: A set of stocks that allows the extension of the matching engine to any number
-            of stocks.
-        books_map: A dictionary mapping stock names to their corresponding order books.
-        orders_map: A dictionary mapping order unique IDs to their corresponding order objects.
+        stock_ids: A dictionary mapping stock names to their ids, that allows the extension of the
+            matching engine to any number of stocks.
+        books_list: A list of order books, indexed by the id of their stock.
+        orders_list: A list of order objects, indexed by their unique IDs. Index 0 is unused,
+            since IDs start at 1.
+        _dispatch: A dictionary mapping the first word of a command to the method handling it.
 
     Notes:
-        The orders_map and books_map are essential data structures to allow for fast search of
-        orders by id, mainly for changing or deleting an order.
+        The orders_list and books_list are essential data structures to allow for fast search of
+        orders by id, mainly for changing or deleting an order. Order IDs are assigned in
+        increasing order as the length of orders_list, so the list is dense and looking an order
+        up is a bounds check and a list index instead of a hash lookup.
+
+        Stock names are resolved to ids only once, when a command is parsed, so orders carry a
+        small int instead of a string and finding the book of an order is a list index instead
+        of a string-keyed dict lookup.
+
+        The instance attributes are declared in __slots__, so the engine has no instance
+        __dict__. The message constants stay plain class attributes.
     """
+    __slots__ = ("stock_ids", "books_list", "orders_list", "_dispatch", "loop")
+
     HELLO_MESSAGE = (
         "PyOME v0.1 - A Python Order Matching Engine\n"
         "Author: Henrique de Carvalho\n"
@@ -37,32 +50,42 @@ class MatchingEngine:
     ORDER_CREATED_MESSAGE = "Order created: {order}"
     ORDER_CHANGED_MESSAGE = "Order changed. New order: {new_order}"
     ORDER_CANCELLED_MESSAGE = "Order cancelled."
-    TRADE_MESSAGE = "Trade, price: {price:.2f}, qty: {quantity}"
+    TRADE_MESSAGE = "Trade, price: %.2f, qty: %d"
     HELP_MESSAGE = (
         "\n"
         "Commands:\n"
-        "      limit <buy|sell:str> <price:float> <quantity:int>     places a limit order\n"
+        "      limit <buy|sell:str> <price:decimal> <quantity:int>   places a limit order\n"
         "      market <buy|sell:str> <quantity:int>                  places a market order\n"
         "      cancel order <id:int>                                 cancels an order\n"
-        "      change order <id:int> <price:float> <quantity:int>    changes an order\n"
+        "      change order <id:int> <price:decimal> <quantity:int>  changes an order\n"
         "      print book                                            prints the book of orders\n"
         "      help                                                  displays this message\n"
         "      exit                                                  exits engine\n"
+        "\n"
+        "Prices take at most 2 decimal places (a tick of 0.01).\n"
     )
     EXIT_MESSAGE = "Exiting PyOME."
 
     def __init__(self):
-        print(self.HELLO_MESSAGE)
-
-        self.uid = 0
-        self.stock_set = {"STOCK", }  # EXTEND: add stocks here or load from db
-        self.books_map: Dict[str, Book] = {stock: Book(stock) for stock in self.stock_set}
-        self.orders_map: Dict[int, Order] = {}
+        self.stock_ids: Dict[str, int] = {"STOCK": 0}  # EXTEND: add stocks here or load from db
+        self.books_list: List[Book] = [Book(stock) for stock in self.stock_ids]
+        self.orders_list: List[Optional[Order]] = [None]
+
+        self._dispatch: Dict[str, Callable[[List[str]], str]] = {
+            "limit": self._handle_limit,
+            "market": self._handle_market,
+            "cancel": self._handle_cancel,
+            "change": self._handle_change,
+            "print": self._handle_print,
+            "exit": self._handle_exit,
+            "list": self._handle_list,
+            "help": self._handle_help,
+        }
 
         self.loop = True
-        self.repl()
 
     def repl(self) -> None:
+        print(self.HELLO_MESSAGE)
         while self.loop:
             cmd = input(">>> ")
             return_msg = self.parse_and_execute(cmd)
@@ -79,167 +102,289 @@ class MatchingEngine:
             Output message to be printed to the user.
 
         Notes:
+            Commands are dispatched on their first word through the _dispatch table, which maps
+            it to a _handle_*() method. This is a single dict lookup, instead of trying each
+            pattern of a match statement in turn. Each handler checks the length and the
+            remaining words of its command.
+
             Orders with quantity = 0 are not allowed for security reasons. The Book class handles
             orders with quantity = 0, but adding such orders may cause the book to slow down or
             even experience a Denial of Service (DoS).
         """
-        stock = "STOCK"  # EXTEND: remove default stock
         cmd_list = cmd.split()
+        if not cmd_list:
+            return self.PARSING_ERROR_MESSAGE
+        return self._dispatch.get(cmd_list[0], self._handle_bad)(cmd_list)
+
+    def _handle_limit(self, cmd_list: List[str]) -> str:
+        """Handles `limit <buy|sell:str> <price:decimal> <quantity:int>`."""
+        # EXTEND: add [..., stock] to extend. If extended, stock requires parsing.
+        if len(cmd_list) != 4:
+            return self.PARSING_ERROR_MESSAGE
+        _, side, price, quantity = cmd_list
+        try:
+            quantity = self.parse_quantity(quantity)
+            price = self.parse_price(price)
+            side = self.parse_side(side)
+        except ValueError:
+            return self.PARSING_ERROR_MESSAGE
+
+        if quantity == 0:
+            return self.EMPTY_ORDER_ERROR_MESSAGE
+
+        # Add new order to stock's book.
+        stock_id = self.stock_ids["STOCK"]  # EXTEND: remove default stock
+        order_id = self.new_uid()
+        book = self.books_list[stock_id]
+        order, trades = book.add_order(
+            order_id, Order.Type.LIMIT, side, quantity, price, stock_id
+        )
+        self.orders_list[order_id] = order
+
+        if not trades:
+            return self.ORDER_CREATED_MESSAGE.format(order=order)
+
+        output = self.format_trades(trades)
+        if self.is_active_order(order_id):
+            output += "\n" + self.ORDER_CREATED_MESSAGE.format(order=order)
+        return output
+
+    def _handle_market(self, cmd_list: List[str]) -> str:
+        """Handles `market <buy|sell:str> <quantity:int>`."""
+        # EXTEND: add [..., stock] to extend. If extended, stock requires parsing.
+        if len(cmd_list) != 3:
+            return self.PARSING_ERROR_MESSAGE
+        _, side, quantity = cmd_list
+        try:
+            quantity = self.parse_quantity(quantity)
+            side = self.parse_side(side)
+        except ValueError:
+            return self.PARSING_ERROR_MESSAGE
+
+        if quantity == 0:
+            return self.EMPTY_ORDER_ERROR_MESSAGE
+
+        # Add new order to stock's book.
+        stock_id = self.stock_ids["STOCK"]  # EXTEND: remove default stock
+        order_id = self.new_uid()
+        book = self.books_list[stock_id]
+        order, trades = book.add_order(
+            order_id, Order.Type.MARKET, side, quantity, stock_id=stock_id,
+        )
+        self.orders_list[order_id] = order
+
+        if not trades:
+            return self.NO_LIQUIDITY_MESSAGE
+
+        return self.format_trades(trades)
+
+    def _handle_cancel(self, cmd_list: List[str]) -> str:
+        """Handles `cancel order <id:int>`."""
+        if len(cmd_list) != 3 or cmd_list[1] != "order":
+            return self.PARSING_ERROR_MESSAGE
+        try:
+            order_id = self.parse_order_id(cmd_list[2])
+        except ValueError:
+            return self.PARSING_ERROR_MESSAGE
+
+        if not self.is_valid_order(order_id):
+            return self.INEXISTENT_ORDER_ERROR_MESSAGE
+        order = self.orders_list[order_id]
+
+        if not self.is_active_order(order_id):
+            return self.INACTIVE_ORDER_ERROR_MESSAGE
+
+        book = self.books_list[order.stock_id]
+        book.delete_order(order)
+        return self.ORDER_CANCELLED_MESSAGE
+
+    def _handle_change(self, cmd_list: List[str]) -> str:
+        """Handles `change order <id:int> <price:decimal> <quantity:int>`."""
+        if len(cmd_list) != 5 or cmd_list[1] != "order":
+            return self.PARSING_ERROR_MESSAGE
+        _, _, order_id, price, quantity = cmd_list
+        try:
+            order_id = self.parse_order_id(order_id)
+            price = self.parse_price(price)
+            quantity = self.parse_quantity(quantity)
+        except ValueError:
+            return self.PARSING_ERROR_MESSAGE
+
+        if quantity == 0:
+            return self.EMPTY_ORDER_ERROR_MESSAGE
+
+        if not self.is_valid_order(order_id):
+            return self.INEXISTENT_ORDER_ERROR_MESSAGE
+        order = self.orders_list[order_id]
+
+        if not self.is_active_order(order_id):
+            return self.INACTIVE_ORDER_ERROR_MESSAGE
+
+        book = self.books_list[order.stock_id]
+        new_order, trades = book.modify_order(
+             order=order,
+             quantity=quantity,
+             price=price,
+        )
+
+        if not trades:
+            return self.ORDER_CHANGED_MESSAGE.format(new_order=new_order)
+
+        output = self.format_trades(trades)
+        if self.is_active_order(order_id):
+            output += "\n" + self.ORDER_CHANGED_MESSAGE.format(new_order=new_order)
+        return output
+
+    def _handle_print(self, cmd_list: List[str]) -> str:
+        """Handles `print book`."""
+        # EXTEND: add [..., stock] to generalize.
+        if len(cmd_list) != 2 or cmd_list[1] != "book":
+            return self.PARSING_ERROR_MESSAGE
+        book = self.books_list[self.stock_ids["STOCK"]]
+        return book.__repr__()
+
+    def _handle_exit(self, cmd_list: List[str]) -> str:
+        """Handles `exit`."""
+        if len(cmd_list) != 1:
+            return self.PARSING_ERROR_MESSAGE
+        self.loop = False
+        return self.EXIT_MESSAGE
+
+    def _handle_list(self, cmd_list: List[str]) -> str:
+        """Handles `list orders`."""
+        if len(cmd_list) != 2 or cmd_list[1] != "orders":
+            return self.PARSING_ERROR_MESSAGE
+        output = []
+        for order in self.orders_list[1:]:
+            print(order)
+        return "\n".join(output)
+
+    def _handle_help(self, cmd_list: List[str]) -> str:
+        """Handles `help`."""
+        if len(cmd_list) != 1:
+            return self.PARSING_ERROR_MESSAGE
+        return self.HELP_MESSAGE
+
+    def _handle_bad(self, cmd_list: List[str]) -> str:
+        """Handles any command that is not in the dispatch table."""
+        return self.PARSING_ERROR_MESSAGE
+
+    def format_trades(self, trades: List[int]) -> str:
+        """
+        Formats one trade message per executed trade.
 
-        match cmd_list:
-            # EXTEND: add [..., stock] to extend. If extended, stock requires parsing.
-            case [ordtype, side, price, quantity] if ordtype == "limit":
-                try:
-                    quantity = self.parse_quantity(quantity)
-                    price = self.parse_price(price)
-                    side = self.parse_side(side)
-                except ValueError:
-                    return self.PARSING_ERROR_MESSAGE
-
-                if quantity == 0:
-                    return self.EMPTY_ORDER_ERROR_MESSAGE
-
-                # Add new order to stock's book.
-                order_id = self.new_uid()
-                book = self.books_map[stock]
-                order, trades = book.add_order(
-                    order_id, Order.Type.LIMIT, side, quantity, price, stock
-                )
-                self.orders_map[order_id] = order
-
-                if not trades:
-                    return self.ORDER_CREATED_MESSAGE.format(order=order)
-
-                output = []
-                for quantity, price in trades:
-                    output.append(self.TRADE_MESSAGE.format(price=price, quantity=quantity))
-                if self.is_active_order(order_id):
-                    output.append(self.ORDER_CREATED_MESSAGE.format(order=order))
-                return "\n".join(output)
-
-            # EXTEND: add [..., stock] to extend. If extended, stock requires parsing.
-            case [ordtype, side, quantity] if ordtype == "market":
-                try:
-                    quantity = self.parse_quantity(quantity)
-                    side = self.parse_side(side)
-                except ValueError:
-                    return self.PARSING_ERROR_MESSAGE
-
-                if quantity == 0:
-                    return self.EMPTY_ORDER_ERROR_MESSAGE
-
-                # Add new order to stock's book.
-                order_id = self.new_uid()
-                book = self.books_map[stock]
-                order, trades = book.add_order(
-                    order_id, Order.Type.MARKET, side, quantity, stock=stock,
-                )
-                self.orders_map[order_id] = order
+        Args:
+            trades: A flat list of alternating quantities and prices of the executed trades.
 
-                # A market order has no reason to exist after executed.
-                book.delete_order(order)
+        Returns:
+            The trade messages, separated by newlines.
 
-                if not trades:
-                    return self.NO_LIQUIDITY_MESSAGE
+        Notes:
+            A sweep through many price levels produces one message per fill, so the messages
+            use printf-style formatting, which is cheaper than str.format(), and are joined
+            into the output in a single step.
+        """
+        trade_message, ticks_per_unit = self.TRADE_MESSAGE, Order.TICKS_PER_UNIT
+        trades_iter = iter(trades)
+        return "\n".join(
+            [trade_message % (price / ticks_per_unit, quantity)
+             for quantity, price in zip(trades_iter, trades_iter)]
+        )
+
+    def submit_batch(
+            self, orders: Iterable[Tuple[Order.Type, Order.Side, int, Union[int, float]]],
+            stock: str = "STOCK"
+    ) -> List[int]:
+        """
+        Places a sequence of already parsed orders in the stock's book, in order.
 
-                output = []
-                for quantity, price in trades:
-                    output.append(self.TRADE_MESSAGE.format(price=price, quantity=quantity))
-                return "\n".join(output)
+        Args:
+            orders: An iterable of (order_type, order_side, quantity, price) tuples, with the
+                price in ticks. The price of market orders is ignored; load_tape() passes
+                float("inf") for them, which is why a float price is accepted.
+            stock: The stock being traded. Defaults to "STOCK".
 
-            case [op_a, op_b, order_id] if op_a == "cancel" and op_b == "order":
-                try:
-                    order_id = self.parse_order_id(order_id)
-                except ValueError:
-                    return self.PARSING_ERROR_MESSAGE
+        Returns:
+            A flat list of all the trades executed by the orders, in the order they happened.
+            Each trade takes two consecutive integers: its quantity and price.
 
-                try:
-                    order = self.orders_map[order_id]
-                except KeyError:
-                    return self.INEXISTENT_ORDER_ERROR_MESSAGE
+        Notes:
+            This is the entry point for replaying a tape of orders. The book and its add_order()
+            are looked up once for the whole batch and no messages are formatted, so each order
+            only pays for its own matching. Orders are validated by the caller.
+        """
+        stock_id = self.stock_ids[stock]
+        add_order = self.books_list[stock_id].add_order
+        trades = []
+        for order_type, side, quantity, price in orders:
+            order_id = self.new_uid()
+            order, order_trades = add_order(order_id, order_type, side, quantity, price, stock_id)
+            self.orders_list[order_id] = order
+            trades.extend(order_trades)
+        return trades
+
+    def load_tape(self, path: str) -> List[int]:
+        """
+        Reads a tape of orders from a CSV file and places all of them with submit_batch().
 
-                if not self.is_active_order(order_id):
-                    return self.INACTIVE_ORDER_ERROR_MESSAGE
+        Args:
+            path: Path to the CSV file. Each row has the fields <limit|market>, <buy|sell>,
+                <quantity:int> and <price:decimal>. The price of market orders may be left empty.
 
-                book = self.books_map[order.stock]
-                book.delete_order(order)
-                return self.ORDER_CANCELLED_MESSAGE
+        Returns:
+            A flat list of alternating quantities and prices of all the trades executed by the
+            orders of the tape.
 
-            case [op_a, op_b, order_id, price, quantity] if op_a == "change" and op_b == "order":
+        Raises:
+            ValueError: If a row cannot be parsed, has quantity = 0 or a limit price that is not
+                a whole tick. No order of the tape is placed in this case.
+        """
+        orders = []
+        with open(path, newline="") as f:
+            for line_num, row in enumerate(csv.reader(f), start=1):
                 try:
-                    order_id = self.parse_order_id(order_id)
-                    price = self.parse_price(price)
+                    ordtype, side, quantity, price = row
                     quantity = self.parse_quantity(quantity)
+                    side = self.parse_side(side)
+                    if quantity == 0:
+                        raise ValueError
+                    if ordtype == "limit":
+                        orders.append((Order.Type.LIMIT, side, quantity, self.parse_price(price)))
+                    elif ordtype == "market":
+                        orders.append((Order.Type.MARKET, side, quantity, float("inf")))
+                    else:
+                        raise ValueError
                 except ValueError:
-                    return self.PARSING_ERROR_MESSAGE
-
-                if quantity == 0:
-                    return self.EMPTY_ORDER_ERROR_MESSAGE
-
-                try:
-                    order = self.orders_map[order_id]
-                except KeyError:
-                    return self.INEXISTENT_ORDER_ERROR_MESSAGE
-
-                if not self.is_active_order(order_id):
-                    return self.INACTIVE_ORDER_ERROR_MESSAGE
-
-                book = self.books_map[order.stock]
-                new_order, trades = book.modify_order(
-                     order=order,
-                     quantity=quantity,
-                     price=price,
-                )
-                self.orders_map[order_id] = new_order
-
-                if not trades:
-                    return self.ORDER_CHANGED_MESSAGE.format(new_order=new_order)
-
-                output = []
-                for quantity, price in trades:
-                    output.append(self.TRADE_MESSAGE.format(price=price, quantity=quantity))
-                if self.is_active_order(order_id):
-                    output.append(self.ORDER_CHANGED_MESSAGE.format(new_order=new_order))
-                return "\n".join(output)
-
-            # EXTEND: add [..., stock] to generalize.
-            case [op_a, op_b] if op_a == "print" and op_b == "book":
-                book = self.books_map[stock]
-                return book.__repr__()
-
-            case [op_a] if op_a == "exit":
-                self.loop = False
-                return self.EXIT_MESSAGE
-
-            case [op_a, op_b] if op_a == "list" and op_b == "orders":
-                output = []
-                for k, v in self.orders_map.items():
-                    print(v)
-                return "\n".join(output)
-
-            case [op_a] if op_a == "help":
-                return self.HELP_MESSAGE
-
-            case _:
-                return self.PARSING_ERROR_MESSAGE
+                    raise ValueError(f"{path}:{line_num}: invalid order {row}") from None
+        return self.submit_batch(orders)
 
     def new_uid(self):
-        self.uid += 1
-        return self.uid
+        self.orders_list.append(None)
+        return len(self.orders_list) - 1
 
     def is_valid_order(self, order_id: int) -> bool:
-        return self.orders_map.get(order_id) is not None
+        return 0 < order_id < len(self.orders_list)
 
     def is_active_order(self, order_id: int) -> bool:
-        return self.orders_map[order_id].quantity != 0
+        return self.orders_list[order_id].quantity > 0
 
     @staticmethod
     def parse_order_id(order_id: str) -> int:
         return int(order_id)
 
     @staticmethod
-    def parse_price(price: str) -> float:
-        return float(price)
+    def parse_price(price: str) -> int:
+        """
+        Converts a decimal price to ticks. Raises ValueError if the price is not finite or does
+        not fall on a whole tick, instead of rounding it to a price the user did not ask for.
+        """
+        ticks = float(price) * Order.TICKS_PER_UNIT
+        if not math.isfinite(ticks):
+            raise ValueError
+        rounded = round(ticks)
+        if abs(ticks - rounded) > abs(ticks) * 1e-12:  # tolerates only the float conversion error
+            raise ValueError
+        return rounded
 
     @staticmethod
     def parse_quantity(quantity: str) -> int:
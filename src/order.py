@@ -14,13 +14,26 @@ class Order:
         order_type: The type of the order (Order.Type.LIMIT | Order.Type.MARKET)
         order_side: The side of the order (Order.Type.BUY | Order.Type.SELL)
         quantity: The number of shares of the order.
-        price: The price per share. Defaults to float("int").
-        stock: The stock being traded. Defaults to "STOCK".
+        price: The price per share, in ticks (see TICKS_PER_UNIT). Defaults to float("int").
+        stock_id: The id of the stock being traded. Defaults to 0, the id of "STOCK".
 
     Notes:
         `price` parameter defaults to float("int") because it is useful to the creation of
         market order, since this order has no price.
+
+        Prices are integers counted in ticks, the minimum price increment, which is 0.01. They
+        are converted from the user's input once, when the order is parsed, and back to units
+        only for display. Integer prices compare faster than floats and are exact, so orders at
+        the same price always land in the same price level.
+
+        The attributes are declared in __slots__, so orders do not carry a per-instance
+        __dict__. This makes each order smaller and cheaper to allocate, which matters since
+        one is created for every order placed.
     """
+    __slots__ = ("order_id", "order_type", "order_side", "quantity", "price", "stock_id")
+
+    TICKS_PER_UNIT = 100
+
     class Type(enum.Enum):
         MARKET = 1
         LIMIT = 2
@@ -31,47 +44,15 @@ class Order:
 
     def __init__(
             self, order_id: int, order_type: Type, order_side: Side,
-            quantity: int, price: float, stock: str = "STOCK"
+            quantity: int, price: int, stock_id: int = 0
     ):
         self.order_id = order_id
         self.order_type = order_type
         self.order_side = order_side
         self.quantity = quantity
         self.price = price
-        self.stock = stock
-
-    def __lt__(self, other: Order) -> bool:
-        """
-        Compare two Order objects based on their price or, in case the prices are equal,
-        based on their order_id.
-
-        Essentially defines how orders should be prioritized in the Book. Lower sell orders have
-        higher priority. Higher buy orders have higher priority. Orders that were placed earlier
-        have higher priority than other orders with the same price.
-
-        Args:
-            other: Other Order object that is compared.
-
-        Returns:
-            True if the order that comes before the operator should be prioritized.
-
-        Notes:
-            This is done through __lt__() because the heapq is a min heap and uses '<' to compare
-            objects. Therefore, if I want to heapify a list of objects, the best way to do it is
-            through __lt__(). To achieve the effect of a max heap for buy orders, buy orders with
-            greater price are read as being less than the other.
-        """
-        if self.order_side != other.order_side:
-            raise Exception
-        elif self.price == other.price:  # priority goes to lower id in case of tie
-            return self.order_id < other.order_id
-        elif self.order_side == Order.Side.SELL:
-            return self.price < other.price
-        elif self.order_side == Order.Side.BUY:
-            return self.price > other.price
-        else:
-            raise Exception
+        self.stock_id = stock_id
 
     def __repr__(self) -> str:
-        side: str = 'buy' if self.order_side == Order.Side.BUY else 'sell'
-        return f"{side} {self.quantity} @ {self.price:.2f} ({self.order_id})"
+        side: str = 'buy' if self.order_side is Order.Side.BUY else 'sell'
+        return f"{side} {self.quantity} @ {self.price / Order.TICKS_PER_UNIT:.2f} ({self.order_id})"
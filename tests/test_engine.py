@@ -1,5 +1,13 @@
+import re
+import sys
+from pathlib import Path
+
 import pytest
 
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from engine import MatchingEngine  # noqa: E402
+
 
 parse_tests = [
     "limit buy 10 100",
@@ -8,3 +16,186 @@ parse_tests = [
     "market buy 150",
     "makret buy 150"
 ]
+
+BOOK_HEADER = (
+    "\n"
+    "        Buy Orders     |     Sell Orders     \n"
+    "  -------------------------------------------"
+)
+
+
+def book_table(*rows: str) -> str:
+    return BOOK_HEADER + "".join("\n" + row for row in rows) + "\n"
+
+
+@pytest.fixture
+def engine() -> MatchingEngine:
+    return MatchingEngine()
+
+
+def test_orders_in_a_level_are_matched_in_arrival_order(engine):
+    engine.parse_and_execute("limit sell 10 100")
+    engine.parse_and_execute("limit sell 10 50")
+
+    assert engine.parse_and_execute("market buy 120") == (
+        "Trade, price: 10.00, qty: 100\n"
+        "Trade, price: 10.00, qty: 20"
+    )
+    assert engine.parse_and_execute("print book") == book_table(
+        "                       |     30 @ 10.00 (2)",
+    )
+
+
+def test_modified_order_keeps_id_priority_in_its_level(engine):
+    for _ in range(3):
+        engine.parse_and_execute("limit sell 10 100")
+
+    assert engine.parse_and_execute("change order 1 10 50") == (
+        "Order changed. New order: sell 50 @ 10.00 (1)"
+    )
+    assert engine.parse_and_execute("print book") == book_table(
+        "                       |     50 @ 10.00 (1)",
+        "                       |    100 @ 10.00 (2)",
+        "                       |    100 @ 10.00 (3)",
+    )
+    assert engine.parse_and_execute("market buy 60") == (
+        "Trade, price: 10.00, qty: 50\n"
+        "Trade, price: 10.00, qty: 10"
+    )
+    assert engine.parse_and_execute("print book") == book_table(
+        "                       |     90 @ 10.00 (2)",
+        "                       |    100 @ 10.00 (3)",
+    )
+
+
+def test_limit_order_sweeps_several_levels_and_rests_remainder(engine):
+    engine.parse_and_execute("limit sell 10.02 100")
+    engine.parse_and_execute("limit sell 10 100")
+    engine.parse_and_execute("limit sell 10.01 100")
+
+    assert engine.parse_and_execute("limit buy 10.01 250") == (
+        "Trade, price: 10.00, qty: 100\n"
+        "Trade, price: 10.01, qty: 100\n"
+        "Order created: buy 50 @ 10.01 (4)"
+    )
+    assert engine.parse_and_execute("print book") == book_table(
+        "       50 @ 10.01 (4)  |    100 @ 10.02 (1)",
+    )
+
+
+def test_cancel_only_order_at_non_best_and_best_level(engine):
+    engine.parse_and_execute("limit buy 10 100")
+    engine.parse_and_execute("limit buy 9.99 100")
+    engine.parse_and_execute("limit buy 9.98 100")
+
+    assert engine.parse_and_execute("cancel order 2") == "Order cancelled."
+    assert engine.parse_and_execute("print book") == book_table(
+        "      100 @ 10.00 (1)  |                     ",
+        "      100 @ 9.98 (3)   |                     ",
+    )
+
+    assert engine.parse_and_execute("cancel order 1") == "Order cancelled."
+    assert engine.parse_and_execute("print book") == book_table(
+        "      100 @ 9.98 (3)   |                     ",
+    )
+
+    # The best bid moved to the next remaining level.
+    assert engine.parse_and_execute("market sell 10") == "Trade, price: 9.98, qty: 10"
+
+
+def write_tape(tmp_path: Path, *rows: str) -> str:
+    path = tmp_path / "tape.csv"
+    path.write_text("".join(row + "\n" for row in rows))
+    return str(path)
+
+
+def test_engine_is_built_without_reading_stdin(monkeypatch, capsys):
+    def no_input(*args):
+        raise AssertionError("MatchingEngine() read from stdin")
+
+    monkeypatch.setattr("builtins.input", no_input)
+    engine = MatchingEngine()
+
+    assert engine.loop
+    assert capsys.readouterr().out == ""
+
+
+def test_load_tape_returns_flat_trades_and_leaves_book(engine, tmp_path):
+    path = write_tape(
+        tmp_path,
+        "limit,buy,100,10.1",
+        "limit,buy,100,10.15",
+        "limit,sell,50,10.20",
+        "market,sell,150,",
+        "limit,sell,100,10.05",
+    )
+
+    assert engine.load_tape(path) == [100, 1015, 50, 1010, 50, 1010]
+    assert engine.parse_and_execute("print book") == book_table(
+        "                       |     50 @ 10.05 (5)",
+        "                       |     50 @ 10.20 (3)",
+    )
+
+
+def test_load_tape_accepts_market_row_with_empty_price(engine, tmp_path):
+    path = write_tape(tmp_path, "limit,sell,10,10", "market,buy,4,")
+
+    assert engine.load_tape(path) == [4, 1000]
+    assert engine.parse_and_execute("print book") == book_table(
+        "                       |      6 @ 10.00 (1)",
+    )
+
+
+@pytest.mark.parametrize("rows, line_num", [
+    (("type,side,quantity,price", "limit,buy,10,10"), 1),
+    (("limit,buy,10,10", "limit,buy,10"), 2),
+    (("limit,buy,10,10", "limit,sell,0,10"), 2),
+])
+def test_load_tape_rejects_bad_row_without_placing_orders(engine, tmp_path, rows, line_num):
+    path = write_tape(tmp_path, *rows)
+
+    with pytest.raises(ValueError, match=f"^{re.escape(path)}:{line_num}: "):
+        engine.load_tape(path)
+
+    assert engine.parse_and_execute("print book") == book_table()
+    assert engine.parse_and_execute("limit buy 10 1") == "Order created: buy 1 @ 10.00 (1)"
+
+
+@pytest.mark.parametrize("price", ["10.005", "0.125", "10.001"])
+def test_off_tick_price_is_rejected(engine, price):
+    engine.parse_and_execute("limit sell 10.01 1")
+
+    assert engine.parse_and_execute(f"limit buy {price} 1") == MatchingEngine.PARSING_ERROR_MESSAGE
+    assert engine.parse_and_execute(f"change order 1 {price} 1") == (
+        MatchingEngine.PARSING_ERROR_MESSAGE
+    )
+    assert engine.parse_and_execute("print book") == book_table(
+        "                       |      1 @ 10.01 (1)",
+    )
+
+
+@pytest.mark.parametrize("price", ["1e308", "inf", "-inf", "nan"])
+def test_non_finite_price_is_rejected(engine, price):
+    assert engine.parse_and_execute(f"limit buy {price} 1") == MatchingEngine.PARSING_ERROR_MESSAGE
+    assert engine.parse_and_execute("print book") == book_table()
+
+
+def test_off_tick_price_in_tape_reports_its_line(engine, tmp_path):
+    path = write_tape(tmp_path, "limit,sell,1,10.01", "limit,buy,1,10.005")
+
+    with pytest.raises(ValueError, match=f"^{re.escape(path)}:2: "):
+        engine.load_tape(path)
+
+
+def test_prices_round_trip_through_ticks_in_printed_book(engine):
+    for price in ["0.01", "0.07", "0.29", "1.1", "10.15", "123456789.99"]:
+        engine.parse_and_execute(f"limit buy {price} 1")
+
+    assert engine.parse_and_execute("print book") == book_table(
+        "        1 @ 123456789.99 (6)|                     ",
+        "        1 @ 10.15 (5)  |                     ",
+        "        1 @ 1.10 (4)   |                     ",
+        "        1 @ 0.29 (3)   |                     ",
+        "        1 @ 0.07 (2)   |                     ",
+        "        1 @ 0.01 (1)   |                     ",
+    )